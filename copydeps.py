@@ -27,11 +27,20 @@
 # THE SOFTWARE.
 #
 
+import argparse
 import os
+import project_index
 import shutil
 import sys
+import tarfile
+import zipfile
 import xml.dom.minidom as xml
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 
 #--------------------------------------------------------------------------------------------------
 # Extract dependencies from project files.
@@ -43,7 +52,8 @@ def get_project_files(directory):
     for entry in os.listdir(directory):
         filepath = os.path.join(directory, entry)
         if os.path.isfile(filepath):
-            if os.path.splitext(filepath)[1] == '.appleseed':
+            # skip the work copies mescaline_postexport.py makes while processing a project
+            if os.path.splitext(filepath)[1] == '.appleseed' and not entry.startswith('_work_'):
                 project_files.append(filepath)
 
     return project_files
@@ -83,20 +93,40 @@ def extract_project_deps(project_filepath):
 
     return True, deps
 
+def extract_project_deps_from_index(project_filepath):
+    try:
+        connection = project_index.open_index(project_filepath)
+    except (IOError, OSError):
+        print("failed to index {0}.".format(project_filepath))
+        return False, set()
+
+    try:
+        paths = project_index.get_file_dependencies(connection)
+    finally:
+        connection.close()
+
+    directory = os.path.split(project_filepath)[0]
+
+    return True, set(os.path.join(directory, convert_path_to_local(path)) for path in paths)
+
+def get_project_deps(project_filepath, use_index):
+    if use_index:
+        return extract_project_deps_from_index(project_filepath)
+    else:
+        return extract_project_deps(project_filepath)
+
 
 #--------------------------------------------------------------------------------------------------
-# Entry point.
+# Copy dependencies to a destination tree.
 #--------------------------------------------------------------------------------------------------
 
-def main():
-    dest_root_dir = sys.argv[1]
-
+def copy_deps(dest_root_dir, use_index):
     already_copied = set()
 
     for project_file in get_project_files("."):
         print("copying assets of {0}: ".format(project_file))
 
-        success, deps = extract_project_deps(project_file)
+        success, deps = get_project_deps(project_file, use_index)
         copied = 0
 
         for dep in deps:
@@ -124,5 +154,203 @@ def main():
 
         print("copied {0} asset files.".format(copied))
 
+
+#--------------------------------------------------------------------------------------------------
+# Pack projects and their dependencies into a single archive, and unpack them.
+#
+# Supported formats, chosen from the archive file extension:
+#
+#   .tar        uncompressed tarball, streamed
+#   .tar.zst    zstd-compressed tarball, streamed (requires the zstandard module)
+#   .zip        uncompressed (stored) zip archive: its central directory allows
+#               individual files to be located and extracted, or memory-mapped,
+#               without reading the whole archive
+#--------------------------------------------------------------------------------------------------
+
+def get_archive_format(archive_filepath):
+    lower = archive_filepath.lower()
+
+    if lower.endswith('.tar.zst') or lower.endswith('.tzst'):
+        if zstandard is None:
+            print("ERROR: the zstandard module is required to handle {0}.".format(archive_filepath))
+            sys.exit(1)
+        return 'tar.zst'
+
+    if lower.endswith('.tar'):
+        return 'tar'
+
+    if lower.endswith('.zip'):
+        return 'zip'
+
+    print("ERROR: unsupported archive format: {0}.".format(archive_filepath))
+    sys.exit(1)
+
+def get_archive_name(filepath):
+    # archive members always use forward slashes and are relative to the archive root
+    # (the current directory); returns None for files outside of it, which could not be
+    # unpacked at the location the project file expects
+    if os.path.isabs(filepath) or os.path.splitdrive(filepath)[0] != '':
+        return None
+
+    path = os.path.normpath(filepath).replace('\\', '/')
+
+    if path == '..' or path.startswith('../'):
+        return None
+
+    return path
+
+def collect_archive_files(project_files, use_index):
+    files = []
+    already_collected = set()
+
+    for project_file in project_files:
+        success, deps = get_project_deps(project_file, use_index)
+        if not success:
+            sys.exit(1)
+
+        for filepath in [ project_file ] + sorted(deps):
+            name = get_archive_name(filepath)
+
+            if name is None:
+                print("ERROR: {0} depends on {1}, which is outside of the current directory and cannot be packed.".format(project_file, filepath))
+                sys.exit(1)
+
+            if name in already_collected:
+                continue
+
+            if not os.path.isfile(filepath):
+                print("ERROR: {0} depends on missing file {1}.".format(project_file, filepath))
+                sys.exit(1)
+
+            already_collected.add(name)
+            files.append((filepath, name))
+
+    return files
+
+def pack(archive_filepath, project_files, use_index):
+    format = get_archive_format(archive_filepath)
+    files = collect_archive_files(project_files, use_index)
+
+    print("packing {0} files into {1}...".format(len(files), archive_filepath))
+
+    if format == 'zip':
+        with zipfile.ZipFile(archive_filepath, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+            for filepath, name in files:
+                archive.write(filepath, name)
+        return
+
+    with open(archive_filepath, 'wb') as file:
+        if format == 'tar.zst':
+            stream = zstandard.ZstdCompressor().stream_writer(file)
+        else:
+            stream = file
+
+        # symbolic links are stored as the files they point to, like in zip archives
+        archive = tarfile.open(fileobj=stream, mode='w|', dereference=True)
+        try:
+            for filepath, name in files:
+                archive.add(filepath, name, recursive=False)
+        finally:
+            archive.close()
+
+        if stream is not file:
+            stream.flush(zstandard.FLUSH_FRAME)
+
+def get_local_dest_filepath(dest_root_dir, name):
+    # rewrite an archive member name into a local path, refusing anything that
+    # would end up outside of the destination directory
+    parts = [ part for part in name.replace('\\', '/').split('/') if part not in ('', '.') ]
+
+    if '..' in parts:
+        return None
+
+    return os.path.join(dest_root_dir, *parts)
+
+def unpack_file(source, dest_filepath):
+    dest_dir = os.path.dirname(dest_filepath)
+
+    if dest_dir and not os.path.exists(dest_dir):
+        os.makedirs(dest_dir)
+
+    with open(dest_filepath, 'wb') as dest:
+        shutil.copyfileobj(source, dest)
+
+def unpack(archive_filepath, dest_root_dir):
+    format = get_archive_format(archive_filepath)
+    unpacked = 0
+    rejected = 0
+
+    if format == 'zip':
+        with zipfile.ZipFile(archive_filepath, 'r') as archive:
+            for info in archive.infolist():
+                if info.filename.endswith('/'):
+                    continue
+                dest_filepath = get_local_dest_filepath(dest_root_dir, info.filename)
+                if dest_filepath is None:
+                    print("ERROR: refusing to unpack {0} outside of {1}.".format(info.filename, dest_root_dir))
+                    rejected += 1
+                    continue
+                source = archive.open(info)
+                try:
+                    unpack_file(source, dest_filepath)
+                finally:
+                    source.close()
+                unpacked += 1
+    else:
+        with open(archive_filepath, 'rb') as file:
+            if format == 'tar.zst':
+                stream = zstandard.ZstdDecompressor().stream_reader(file)
+            else:
+                stream = file
+
+            archive = tarfile.open(fileobj=stream, mode='r|')
+            try:
+                for info in archive:
+                    if not info.isfile():
+                        if not info.isdir():
+                            print("ERROR: refusing to unpack {0}, which is not a regular file.".format(info.name))
+                            rejected += 1
+                        continue
+                    dest_filepath = get_local_dest_filepath(dest_root_dir, info.name)
+                    if dest_filepath is None:
+                        print("ERROR: refusing to unpack {0} outside of {1}.".format(info.name, dest_root_dir))
+                        rejected += 1
+                        continue
+                    unpack_file(archive.extractfile(info), dest_filepath)
+                    unpacked += 1
+            finally:
+                archive.close()
+
+    print("unpacked {0} files to {1}.".format(unpacked, dest_root_dir))
+
+    if rejected > 0:
+        print("ERROR: {0} files could not be unpacked.".format(rejected))
+        sys.exit(1)
+
+
+#--------------------------------------------------------------------------------------------------
+# Entry point.
+#--------------------------------------------------------------------------------------------------
+
+def main():
+    parser = argparse.ArgumentParser(description="copy or package the dependencies of the project files in the current directory.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("dest", nargs='?', help="copy the dependencies into this directory")
+    group.add_argument("--pack", nargs='+', metavar=("archive", "project"),
+                       help="pack project files (all project files in the current directory if omitted) and their dependencies into a single archive (.tar, .tar.zst or .zip)")
+    group.add_argument("--unpack", nargs=2, metavar=("archive", "dest"),
+                       help="unpack an archive created with --pack into a directory")
+    parser.add_argument("--index", action='store_true',
+                        help="read dependencies from the sidecar index of each project file, (re)building it if needed")
+    args = parser.parse_args()
+
+    if args.pack is not None:
+        project_files = args.pack[1:] if len(args.pack) > 1 else get_project_files(".")
+        pack(args.pack[0], project_files, args.index)
+    elif args.unpack is not None:
+        unpack(args.unpack[0], args.unpack[1])
+    else:
+        copy_deps(args.dest, args.index)
+
 if __name__ == '__main__':
     main()
@@ -22,20 +22,37 @@
 #
 
 import argparse
+import copy
+import json
+import math
+import multiprocessing
 import xml.etree.ElementTree as xml
 import os
+import project_index
+import re
 import shutil
 import subprocess
 import sys
 
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
 
 #--------------------------------------------------------------------------------------------------
 # Constants.
 #--------------------------------------------------------------------------------------------------
 
 BACKUP_DIRECTORY = "_backup"
+WORK_FILE_PREFIX = "_work_"
 TEXTURES_DIRECTORY = "_textures"
 SKY_TEXTURE_FILENAME = "sky_dusk_00.exr"
+PROXY_DIRECTORY = "_proxy"
+PROXY_PROJECT_SUFFIX = ".proxy"
+PROXY_RESOLUTION_SCALE = 0.5
+PROXY_SAMPLE_COUNT = "1"
+MESH_STATS_CACHE_FILENAME = "_mesh_stats.cache"
 
 
 #--------------------------------------------------------------------------------------------------
@@ -51,21 +68,382 @@ def update_project_file(filepath, tool_path, additional_args=None):
     subprocess.call(args)
 
 
+#--------------------------------------------------------------------------------------------------
+# Compact in-memory scene model.
+#
+# Parameters are stored as (name, value) records and other elements as entity records
+# with name and model fields; all strings are interned so that repeated names and values
+# are only stored once. Project, scene and assembly records keep per-type arrays of their
+# descendants (parameters excluded) along with a name index, both rebuilt lazily after
+# entities are added or removed. Records implement the subset of the ElementTree API used
+# by the tweaks in this file and are converted back to ElementTree to be written.
+#--------------------------------------------------------------------------------------------------
+
+try:
+    intern_builtin = sys.intern
+except AttributeError:
+    intern_builtin = intern
+
+def intern_string(value):
+    if value is None:
+        return None
+
+    try:
+        return intern_builtin(value)
+    except TypeError:
+        # Python 2 cannot intern unicode strings
+        return value
+
+INDEXED_TAGS = [ 'project', 'scene', 'assembly' ]
+
+PARAMETER_KEYS = ('name', 'value')
+
+PATH_PATTERN = re.compile(r"^(\w+)(?:\[@(\w+)='([^']*)'\])?$")
+
+compiled_paths = dict()
+attribute_keys = dict()
+
+def compile_path(path):
+    # only "tag" and "tag[@key='value']" paths are supported
+    compiled = compiled_paths.get(path)
+
+    if compiled is None:
+        match = PATH_PATTERN.match(path)
+        if match is None:
+            raise ValueError("unsupported path: {0}".format(path))
+        compiled = compiled_paths[path] = match.groups()
+
+    return compiled
+
+def intern_keys(keys):
+    return attribute_keys.setdefault(keys, keys)
+
+class Attributes(object):
+    # dictionary-like view over the attributes of a record
+
+    __slots__ = ('node',)
+
+    def __init__(self, node):
+        self.node = node
+
+    def __getitem__(self, key):
+        if key not in self.node.keys():
+            raise KeyError(key)
+        return self.node.get(key)
+
+    def __setitem__(self, key, value):
+        self.node.set(key, value)
+
+    def __contains__(self, key):
+        return key in self.node.keys()
+
+    def __iter__(self):
+        return iter(self.node.keys())
+
+    def __len__(self):
+        return len(self.node.keys())
+
+    def get(self, key, default=None):
+        return self.node.get(key, default)
+
+    def keys(self):
+        return list(self.node.keys())
+
+    def items(self):
+        return [ (key, self.node.get(key)) for key in self.node.keys() ]
+
+class Parameter(object):
+    __slots__ = ('name', 'value', 'tail')
+
+    tag = 'parameter'
+    text = None
+
+    def __init__(self, name, value, tail=None):
+        self.name = intern_string(name)
+        self.value = intern_string(value)
+        self.tail = tail
+
+    def __deepcopy__(self, memo):
+        return Parameter(self.name, self.value, self.tail)
+
+    def __len__(self):
+        return 0
+
+    def __iter__(self):
+        return iter(())
+
+    @property
+    def attrib(self):
+        return Attributes(self)
+
+    def keys(self):
+        return PARAMETER_KEYS
+
+    def get(self, key, default=None):
+        if key == 'name':
+            return self.name
+        if key == 'value':
+            return self.value
+        return default
+
+    def set(self, key, value):
+        if key == 'name':
+            self.name = intern_string(value)
+        elif key == 'value':
+            self.value = intern_string(value)
+        else:
+            raise KeyError(key)
+
+    def iter(self, tag=None):
+        if tag is None or tag == 'parameter':
+            yield self
+
+    def find(self, path):
+        return None
+
+    def findall(self, path):
+        return []
+
+    def to_element(self):
+        element = xml.Element('parameter')
+        element.set('name', self.name)
+        element.set('value', self.value)
+        element.tail = self.tail
+        return element
+
+class Entity(object):
+    __slots__ = ('tag', 'keys_order', 'name', 'model', 'extra', 'children', 'text', 'tail',
+                 'index', 'index_generation')
+
+    # incremented whenever an entity is added or removed anywhere, to invalidate indices
+    generation = 0
+
+    def __init__(self, tag):
+        self.tag = intern_string(tag)
+        self.keys_order = ()
+        self.name = None
+        self.model = None
+        self.extra = None
+        self.children = ()
+        self.text = None
+        self.tail = None
+        self.index = None
+        self.index_generation = -1
+
+    def __deepcopy__(self, memo):
+        node = Entity(self.tag)
+        node.keys_order = self.keys_order
+        node.name = self.name
+        node.model = self.model
+        node.extra = None if self.extra is None else dict(self.extra)
+        node.children = [ copy.deepcopy(child, memo) for child in self.children ] if len(self.children) > 0 else ()
+        node.text = self.text
+        node.tail = self.tail
+        return node
+
+    @property
+    def attrib(self):
+        return Attributes(self)
+
+    def keys(self):
+        return self.keys_order
+
+    def get(self, key, default=None):
+        if key == 'name':
+            value = self.name
+        elif key == 'model':
+            value = self.model
+        else:
+            value = None if self.extra is None else self.extra.get(key)
+        return default if value is None else value
+
+    def set(self, key, value):
+        key = intern_string(key)
+        value = intern_string(value)
+
+        if key not in self.keys_order:
+            self.keys_order = intern_keys(self.keys_order + (key,))
+
+        if key == 'name':
+            self.name = value
+        elif key == 'model':
+            self.model = value
+        else:
+            if self.extra is None:
+                self.extra = dict()
+            self.extra[key] = value
+
+    def __len__(self):
+        return len(self.children)
+
+    def __iter__(self):
+        return iter(self.children)
+
+    def __getitem__(self, index):
+        return self.children[index]
+
+    def __setitem__(self, index, node):
+        self.mutable_children()[index] = node
+        Entity.generation += 1
+
+    def mutable_children(self):
+        if not isinstance(self.children, list):
+            self.children = list(self.children)
+        return self.children
+
+    def append(self, node):
+        self.mutable_children().append(node)
+        self.modified(node)
+
+    def insert(self, index, node):
+        self.mutable_children().insert(index, node)
+        self.modified(node)
+
+    def remove(self, node):
+        self.mutable_children().remove(node)
+        self.modified(node)
+
+    def modified(self, node):
+        # parameters are not indexed, adding or removing them keeps indices valid
+        if node.tag != 'parameter':
+            Entity.generation += 1
+
+    def get_index(self):
+        if self.index is None or self.index_generation != Entity.generation:
+            by_type = dict()
+            pending = list(reversed(self.children))
+            while len(pending) > 0:
+                node = pending.pop()
+                if node.tag == 'parameter':
+                    continue
+                by_type.setdefault(node.tag, []).append(node)
+                pending.extend(reversed(node.children))
+            self.index = (by_type, dict())
+            self.index_generation = Entity.generation
+        return self.index
+
+    def iter(self, tag=None):
+        if tag is None or self.tag == tag:
+            yield self
+
+        if tag is not None and tag != 'parameter' and self.tag in INDEXED_TAGS:
+            for node in self.get_index()[0].get(tag, ()):
+                yield node
+            return
+
+        for child in self.children:
+            for node in child.iter(tag):
+                yield node
+
+    def lookup(self, tag, name):
+        # return the first entity of a given type and name in this subtree
+        if self.tag == tag and self.name == name:
+            return self
+
+        if self.tag not in INDEXED_TAGS:
+            for node in self.iter(tag):
+                if node.get('name') == name:
+                    return node
+            return None
+
+        by_type, by_name = self.get_index()
+        names = by_name.get(tag)
+
+        if names is None:
+            names = by_name[tag] = dict()
+            for node in by_type.get(tag, ()):
+                names.setdefault(node.name, node)
+
+        return names.get(name)
+
+    def find(self, path):
+        tag, key, value = compile_path(path)
+        for child in self.children:
+            if child.tag == tag and (key is None or child.get(key) == value):
+                return child
+        return None
+
+    def findall(self, path):
+        tag, key, value = compile_path(path)
+        return [ child for child in self.children if child.tag == tag and (key is None or child.get(key) == value) ]
+
+    def to_element(self):
+        element = xml.Element(self.tag)
+        for key in self.keys_order:
+            element.set(key, self.get(key))
+        element.text = self.text
+        element.tail = self.tail
+        element.extend([ child.to_element() for child in self.children ])
+        return element
+
+def make_node(element, children):
+    attrib = element.attrib
+
+    if element.tag == 'parameter' and len(children) == 0 and element.text is None and list(attrib.keys()) == list(PARAMETER_KEYS):
+        return Parameter(attrib['name'], attrib['value'])
+
+    node = Entity(element.tag)
+    for key, value in attrib.items():
+        node.set(key, value)
+    node.text = intern_string(element.text)
+    if len(children) > 0:
+        node.children = children
+
+    return node
+
+def convert_element(element):
+    children = [ convert_element(child) for child in element ]
+    for node, child in zip(children, element):
+        node.tail = intern_string(child.tail)
+    return make_node(element, children)
+
+class Scene(object):
+    __slots__ = ('root',)
+
+    def __init__(self, root):
+        self.root = root
+
+    def __deepcopy__(self, memo):
+        return Scene(copy.deepcopy(self.root, memo))
+
+    def getroot(self):
+        return self.root
+
+    def write(self, filepath):
+        xml.ElementTree(self.root.to_element()).write(filepath)
+
+def load_scene(filepath):
+    # elements are converted as soon as they are complete and then cleared, so that
+    # the full ElementTree is never held in memory; the tail of an element may only
+    # be known once its parent is complete
+    stack = [ [] ]
+
+    for event, element in xml.iterparse(filepath, events=('start', 'end')):
+        if event == 'start':
+            stack.append([])
+        else:
+            children = stack.pop()
+            for node, child in zip(children, element):
+                node.tail = intern_string(child.tail)
+            stack[-1].append(make_node(element, children))
+            tail = element.tail
+            element.clear()
+            element.tail = tail
+
+    return Scene(stack[0][0])
+
+
 #--------------------------------------------------------------------------------------------------
 # Load/write a given project file to/from memory.
 #--------------------------------------------------------------------------------------------------
 
 def load_project_file(filepath):
-    tree = xml.ElementTree()
-
     try:
-        tree.parse(filepath)
+        return load_scene(filepath)
     except IOError:
         print("ERROR: failed to load project file {0}.".format(filepath))
         sys.exit(1)
 
-    return tree
-
 def write_project_file(filepath, tree):
     try:
         tree.write(filepath)
@@ -91,10 +469,7 @@ def walk(directory, recursive):
 def set_param(entity, name, value):
     param = entity.find("parameter[@name='" + name + "']")
     if param is None:
-        param = xml.Element('parameter')
-        param.attrib['name'] = name
-        param.attrib['value'] = value
-        entity.insert(0, param)
+        entity.insert(0, Parameter(name, value))
     else:
         param.attrib['value'] = value
 
@@ -103,11 +478,7 @@ def get_param(entity, name):
     return None if param is None else param.attrib['value']
 
 def find_entity(root, type, name):
-    # return next(root.iterfind(type + "[@name='" + name + "']"), None)
-    for node in root.iter(type):
-        if node.attrib['name'] == name:
-            return node
-    return None
+    return root.lookup(type, name)
 
 def find_material(root, name):
     return find_entity(root, 'material', name)
@@ -222,7 +593,7 @@ def fixup_hair_material(assembly, material):
 
 def add_hair_bsdf_network(assembly, reflectance_name):
     print("    Adding BSDF \"{0}\" with reflectance \"{1}\" to assembly \"{2}\"...".format(NEW_ROOT_HAIR_BRDF_NAME, reflectance_name, assembly.attrib['name']))
-    hair_brdf = xml.Element('bsdf')
+    hair_brdf = Entity('bsdf')
     hair_brdf.attrib['name'] = NEW_ROOT_HAIR_BRDF_NAME
     hair_brdf.attrib['model'] = "microfacet_brdf"
     set_param(hair_brdf, "mdf", "ward")
@@ -294,7 +665,7 @@ def fixup_wolf_eye_material(assembly, material):
 
 def add_wolf_eye_surface_shader(assembly, reflectance_name):
     print("    Adding surface shader \"{0}\" with color \"{1}\" to assembly \"{2}\"...".format(NEW_WOLF_EYE_SURFACE_SHADER_NAME, reflectance_name, assembly.attrib['name']))
-    eye_shader = xml.Element('surface_shader')
+    eye_shader = Entity('surface_shader')
     eye_shader.attrib['name'] = NEW_WOLF_EYE_SURFACE_SHADER_NAME
     eye_shader.attrib['model'] = "constant_surface_shader"
     set_param(eye_shader, "color", reflectance_name)
@@ -404,28 +775,28 @@ def add_sky(root, horizontal_shift):
 
     scene = root.find("scene")
 
-    texture = xml.Element('texture')
+    texture = Entity('texture')
     texture.attrib['name'] = "sky_dusk_00"
     texture.attrib['model'] = "disk_texture_2d"
     set_param(texture, "color_space", "srgb")
     set_param(texture, "filename", TEXTURES_DIRECTORY + "/" + SKY_TEXTURE_FILENAME)
     scene.append(texture)
 
-    texture_inst = xml.Element('texture_instance')
+    texture_inst = Entity('texture_instance')
     texture_inst.attrib['name'] = "sky_dusk_00_inst"
     texture_inst.attrib['texture'] = "sky_dusk_00"
     set_param(texture_inst, "addressing_mode", "wrap")
     set_param(texture_inst, "filtering_mode", "bilinear")
     scene.append(texture_inst)
 
-    environment_edf = xml.Element('environment_edf')
+    environment_edf = Entity('environment_edf')
     environment_edf.attrib['name'] = "environment_edf"
     environment_edf.attrib['model'] = "latlong_map_environment_edf"
     set_param(environment_edf, "radiance", "sky_dusk_00_inst")
     set_param(environment_edf, "horizontal_shift", horizontal_shift)
     scene.append(environment_edf)
 
-    environment_shader = xml.Element('environment_shader')
+    environment_shader = Entity('environment_shader')
     environment_shader.attrib['name'] = "environment_shader"
     environment_shader.attrib['model'] = "edf_environment_shader"
     set_param(environment_shader, "environment_edf", "environment_edf")
@@ -471,10 +842,621 @@ def assign_render_layers(root):
             assign_render_layers_to_nodes([ inst ], "hurricane_light")
 
 
+#--------------------------------------------------------------------------------------------------
+# Validate references between entities and prune unused entities.
+#--------------------------------------------------------------------------------------------------
+
+# Entities that can be referenced by name from other entities.
+REFERENCEABLE_ENTITY_TYPES = [ 'color', 'texture', 'texture_instance', 'bsdf', 'edf', 'surface_shader',
+                               'material', 'object', 'assembly', 'camera', 'environment_edf',
+                               'environment_shader' ]
+
+# Entities that only matter if something references them.
+PRUNABLE_ENTITY_TYPES = [ 'color', 'texture', 'texture_instance', 'bsdf', 'edf', 'surface_shader', 'material' ]
+
+# Parameters whose value must either be a literal number or the name of an existing entity
+# of one of the given types. Any other parameter whose value happens to name an entity is
+# also recorded as a reference.
+COLOR_OR_TEXTURE = [ 'color', 'texture_instance' ]
+REFERENCE_PARAMETERS = {
+    'material':             { 'bsdf': [ 'bsdf' ],
+                              'edf': [ 'edf' ],
+                              'surface_shader': [ 'surface_shader' ],
+                              'alpha_map': COLOR_OR_TEXTURE,
+                              'normal_map': [ 'texture_instance' ] },
+    'bsdf':                 { 'bsdf0': [ 'bsdf' ],
+                              'bsdf1': [ 'bsdf' ],
+                              'reflectance': COLOR_OR_TEXTURE,
+                              'transmittance': COLOR_OR_TEXTURE },
+    'edf':                  { 'exitance': COLOR_OR_TEXTURE },
+    'light':                { 'exitance': COLOR_OR_TEXTURE,
+                              'radiance': COLOR_OR_TEXTURE },
+    'environment_edf':      { 'exitance': COLOR_OR_TEXTURE,
+                              'radiance': COLOR_OR_TEXTURE },
+    'environment_shader':   { 'environment_edf': [ 'environment_edf' ] },
+    'environment':          { 'environment_edf': [ 'environment_edf' ],
+                              'environment_shader': [ 'environment_shader' ] },
+    'frame':                { 'camera': [ 'camera' ] }
+}
+
+# Entity attributes that reference another entity, whose type is the attribute name.
+REFERENCE_ATTRIBUTES = project_index.REFERENCE_ATTRIBUTES
+
+def is_literal_value(value):
+    if len(value.strip()) == 0:
+        return True
+
+    try:
+        for token in value.split():
+            float(token)
+    except ValueError:
+        return False
+
+    return True
+
+def build_reference_graph(root):
+    # Collects, in a single traversal, every named entity along with its parent and
+    # scope, and every reference made by an entity. A scope is the list of symbol
+    # tables (name -> entities) of the enclosing assemblies, innermost first, the
+    # last one being shared by the scene and the output frames.
+    entities = []
+    references = []
+
+    def visit(node, parent, scope, owner):
+        tag = node.tag
+
+        if tag in REFERENCEABLE_ENTITY_TYPES:
+            scope[0].setdefault(node.attrib['name'], []).append(node)
+
+        if 'name' in node.attrib and tag not in ('parameter', 'parameters'):
+            entities.append((node, parent, scope))
+            owner = node
+
+        if tag == 'parameter' and owner is not None and parent is owner:
+            name = node.attrib['name']
+            types = REFERENCE_PARAMETERS.get(owner.tag, {}).get(name)
+            references.append((owner, scope, name, node.attrib.get('value', ''), types))
+
+        if tag in REFERENCE_ATTRIBUTES:
+            name = REFERENCE_ATTRIBUTES[tag]
+            references.append((owner, scope, name, node.attrib.get(name, ''), [ name ]))
+
+        child_scope = [ dict() ] + scope if tag == 'assembly' else scope
+
+        for child in node:
+            visit(child, node, child_scope, owner)
+
+    visit(root, None, [ dict() ], None)
+
+    return entities, references
+
+def resolve_reference(scope, value, types=None):
+    # entities of different types may share a name, so only the expected types are considered
+    for symbols in scope:
+        targets = [ node for node in symbols.get(value, []) if types is None or node.tag in types ]
+        if len(targets) > 0:
+            return targets
+
+    # object instances may reference a part of a mesh object, e.g. "object.part"
+    if types is not None and 'object' not in types:
+        return []
+
+    parts = value.split('.')
+    for i in range(len(parts) - 1, 0, -1):
+        prefix = '.'.join(parts[:i])
+        for symbols in scope:
+            targets = [ node for node in symbols.get(prefix, []) if node.tag == 'object' ]
+            if len(targets) > 0:
+                return targets
+
+    return []
+
+def resolve_reference_graph(entities, references):
+    edges = dict()
+    errors = []
+
+    for owner, scope, name, value, types in references:
+        targets = resolve_reference(scope, value, types)
+
+        if len(targets) > 0:
+            edges.setdefault(owner, []).extend(targets)
+            continue
+
+        if types is None or is_literal_value(value):
+            continue
+
+        mismatches = resolve_reference(scope, value)
+
+        if len(mismatches) > 0:
+            errors.append("{0} \"{1}\": \"{2}\" references {3} \"{4}\" instead of a {5}".format(
+                owner.tag, owner.attrib['name'], name, mismatches[0].tag, value, " or ".join(types)))
+        else:
+            errors.append("{0} \"{1}\": \"{2}\" references unknown entity \"{3}\"".format(
+                owner.tag, owner.attrib['name'], name, value))
+
+    return edges, errors
+
+def validate_references(root):
+    entities, references = build_reference_graph(root)
+    edges, errors = resolve_reference_graph(entities, references)
+
+    for error in errors:
+        print("ERROR: {0}.".format(error))
+
+    return len(errors) == 0
+
+def collect_reachable_entities(entities, edges):
+    # everything that cannot be pruned keeps alive what it references
+    reachable = set()
+    pending = [ node for node, parent, scope in entities if node.tag not in PRUNABLE_ENTITY_TYPES ]
+
+    while len(pending) > 0:
+        node = pending.pop()
+        if node in reachable:
+            continue
+        reachable.add(node)
+        pending.extend(edges.get(node, []))
+
+    return reachable
+
+def prune_unused_entities(root):
+    print("  Pruning unused entities:")
+
+    entities, references = build_reference_graph(root)
+    edges, errors = resolve_reference_graph(entities, references)
+
+    # reachability cannot be trusted if references do not resolve
+    if len(errors) > 0:
+        for error in errors:
+            print("ERROR: {0}.".format(error))
+        print("ERROR: cannot prune unused entities of a project with invalid references.")
+        sys.exit(1)
+
+    reachable = collect_reachable_entities(entities, edges)
+
+    pruned = 0
+
+    for node, parent, scope in entities:
+        if node.tag in PRUNABLE_ENTITY_TYPES and node not in reachable:
+            print("    Removing unused {0} \"{1}\"...".format(node.tag, node.attrib['name']))
+            for filename in node.iter('parameter'):
+                if filename.attrib['name'] == 'filename':
+                    print("      Dropping file dependency {0}...".format(filename.attrib['value']))
+            parent.remove(node)
+            pruned += 1
+
+    print("  Removed {0} unused entities.".format(pruned))
+
+
+#--------------------------------------------------------------------------------------------------
+# Derive a lightweight proxy project for interactive lookdev renders.
+#
+# Downsampled textures and decimated meshes are picked up from a _proxy directory
+# next to the original file (e.g. _textures/_proxy/sky_dusk_00.exr for
+# _textures/sky_dusk_00.exr) whenever they exist; the original file is kept otherwise.
+#--------------------------------------------------------------------------------------------------
+
+def get_proxy_project_filepath(filepath):
+    base, ext = os.path.splitext(filepath)
+    return base + PROXY_PROJECT_SUFFIX + ext
+
+def is_proxy_project_file(filepath):
+    return os.path.splitext(os.path.splitext(filepath)[0])[1] == PROXY_PROJECT_SUFFIX
+
+def get_proxy_filepath(path):
+    head, sep, tail = path.replace('\\', '/').rpartition('/')
+    return head + sep + PROXY_DIRECTORY + '/' + tail
+
+def use_proxy_file(param, project_directory):
+    proxy_path = get_proxy_filepath(param.attrib['value'])
+
+    if not os.path.isfile(os.path.join(project_directory, proxy_path)):
+        return 0
+
+    param.attrib['value'] = proxy_path
+
+    return 1
+
+def use_proxy_textures(root, project_directory):
+    found = 0
+
+    for texture in root.iter('texture'):
+        if texture.attrib['model'] != 'disk_texture_2d':
+            continue
+
+        for parameter in texture.findall('parameter'):
+            if parameter.attrib['name'] == 'filename':
+                found += use_proxy_file(parameter, project_directory)
+
+    print("  Using downsampled variants for {0} textures.".format(found))
+
+def use_proxy_meshes(root, project_directory):
+    found = 0
+
+    for object in root.iter('object'):
+        if object.attrib['model'] != 'mesh_object':
+            continue
+
+        for parameter in object.findall('parameter'):
+            if parameter.attrib['name'] == 'filename':
+                found += use_proxy_file(parameter, project_directory)
+
+        for parameters in object.iter('parameters'):
+            for parameter in parameters.findall('parameter'):
+                found += use_proxy_file(parameter, project_directory)
+
+    print("  Using decimated variants for {0} mesh files.".format(found))
+
+def scale_frame_resolution(frame, scale):
+    resolution = get_param(frame, "resolution")
+    if resolution is None:
+        return
+
+    width, height = [ int(value) for value in resolution.split() ]
+    width = max(1, int(round(width * scale)))
+    height = max(1, int(round(height * scale)))
+
+    print("    Setting resolution to {0}x{1} on frame \"{2}\"...".format(width, height, frame.attrib['name']))
+    set_param(frame, "resolution", "{0} {1}".format(width, height))
+
+    crop_window = get_param(frame, "crop_window")
+    if crop_window is None:
+        return
+
+    # the crop window holds inclusive pixel coordinates: min x, min y, max x, max y
+    min_x, min_y, max_x, max_y = [ int(value) for value in crop_window.split() ]
+    min_x = min(width - 1, int(math.floor(min_x * scale)))
+    min_y = min(height - 1, int(math.floor(min_y * scale)))
+    max_x = max(min_x, min(width - 1, int(math.ceil((max_x + 1) * scale)) - 1))
+    max_y = max(min_y, min(height - 1, int(math.ceil((max_y + 1) * scale)) - 1))
+
+    print("    Setting crop window to ({0}, {1})-({2}, {3}) on frame \"{4}\"...".format(min_x, min_y, max_x, max_y, frame.attrib['name']))
+    set_param(frame, "crop_window", "{0} {1} {2} {3}".format(min_x, min_y, max_x, max_y))
+
+def reduce_sample_counts(root, sample_count):
+    for surface_shader in root.iter('surface_shader'):
+        if surface_shader.attrib['model'] == 'physical_surface_shader':
+            set_param(surface_shader, "front_lighting_samples", sample_count)
+
+def make_proxy_project(root, project_directory, resolution_scale):
+    print("  Tweaking frames for proxy rendering:")
+    for frame in root.iter('frame'):
+        scale_frame_resolution(frame, resolution_scale)
+
+    print("  Setting sample count to \"{0}\" on all physical surface shaders...".format(PROXY_SAMPLE_COUNT))
+    reduce_sample_counts(root, PROXY_SAMPLE_COUNT)
+
+    use_proxy_textures(root, project_directory)
+    use_proxy_meshes(root, project_directory)
+
+
+#--------------------------------------------------------------------------------------------------
+# Distribute a global sample budget across physical surface shaders.
+#
+# Each shader gets a share of the budget proportional to the surface area of the meshes
+# it is assigned to (or to their triangle count when the area is unknown), multiplied by
+# a priority depending on the name of the materials that use it.
+#--------------------------------------------------------------------------------------------------
+
+MIN_SAMPLE_COUNT = 1
+MAX_SAMPLE_COUNT = 64
+
+SAMPLE_PRIORITIES = [ ("_face_", 8.0),
+                      ("hood_body", 8.0),
+                      ("wolf_teeth_", 16.0) ]
+
+def get_obj_mesh_stats(filepath):
+    vertices = []
+    triangle_count = 0
+    area = 0.0
+
+    def vertex(index):
+        index = int(index.split('/')[0])
+        return vertices[index - 1 if index > 0 else index]
+
+    def triangle_area(a, b, c):
+        u = (b[0] - a[0], b[1] - a[1], b[2] - a[2])
+        v = (c[0] - a[0], c[1] - a[1], c[2] - a[2])
+        n = (u[1] * v[2] - u[2] * v[1], u[2] * v[0] - u[0] * v[2], u[0] * v[1] - u[1] * v[0])
+        return 0.5 * math.sqrt(n[0] * n[0] + n[1] * n[1] + n[2] * n[2])
+
+    with open(filepath, 'r') as file:
+        for line in file:
+            tokens = line.split()
+            if len(tokens) == 0:
+                continue
+            if tokens[0] == 'v':
+                vertices.append((float(tokens[1]), float(tokens[2]), float(tokens[3])))
+            elif tokens[0] == 'f':
+                corners = [ vertex(token) for token in tokens[1:] ]
+                for i in range(1, len(corners) - 1):
+                    area += triangle_area(corners[0], corners[i], corners[i + 1])
+                    triangle_count += 1
+
+    return triangle_count, area
+
+def get_file_signature(filepath):
+    stat = os.stat(filepath)
+    return [ stat.st_size, int(stat.st_mtime) ]
+
+def load_mesh_stats_cache(project_directory):
+    cache_filepath = os.path.join(project_directory, MESH_STATS_CACHE_FILENAME)
+
+    try:
+        with open(cache_filepath, 'r') as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return dict()
+
+def write_mesh_stats_cache(project_directory, cache):
+    cache_filepath = os.path.join(project_directory, MESH_STATS_CACHE_FILENAME)
+
+    try:
+        with open(cache_filepath, 'w') as file:
+            json.dump(cache, file, indent=1, sort_keys=True)
+    except IOError:
+        print("    Failed to write mesh statistics cache {0}.".format(cache_filepath))
+
+def get_mesh_stats(filepath, key, cache):
+    # binarymesh files store neither triangle count nor surface area in their header, so
+    # statistics are computed from the .obj file they were converted from and cached along
+    # with the signature (size and modification time) of both files; an entry stays valid
+    # as long as the .obj file is unchanged, or if it is gone, as long as the mesh file is
+    source_filepath = filepath
+    if os.path.splitext(filepath)[1].lower() == '.binarymesh':
+        source_filepath = os.path.splitext(filepath)[0] + '.obj'
+
+    source_signature = get_file_signature(source_filepath) if os.path.isfile(source_filepath) else None
+    mesh_signature = get_file_signature(filepath) if os.path.isfile(filepath) else None
+
+    entry = cache.get(key)
+
+    if entry is not None:
+        if source_signature is not None and entry['source'] == source_signature:
+            return entry['triangles'], entry['area']
+        if source_signature is None and mesh_signature is not None and entry['mesh'] == mesh_signature:
+            return entry['triangles'], entry['area']
+
+    if source_signature is None:
+        print("    No .obj source for {0}, counting its instances as average instances.".format(filepath))
+        return None
+
+    try:
+        triangle_count, area = get_obj_mesh_stats(source_filepath)
+    except (IOError, ValueError, IndexError):
+        print("    Failed to read mesh statistics from {0}, counting its instances as average instances.".format(source_filepath))
+        return None
+
+    cache[key] = { 'source': source_signature, 'mesh': mesh_signature, 'triangles': triangle_count, 'area': area }
+
+    return triangle_count, area
+
+def get_object_filepath(object):
+    filename = get_param(object, 'filename')
+
+    if filename is None:
+        parameters = object.find("parameters[@name='filename']")
+        if parameters is not None and len(parameters) > 0:
+            filename = parameters[0].attrib['value']
+
+    return filename
+
+def get_material_priority(material_name):
+    priority = 1.0
+
+    for material_marker, marker_priority in SAMPLE_PRIORITIES:
+        if material_marker in material_name:
+            priority = max(priority, marker_priority)
+
+    return priority
+
+def compute_surface_shader_weights(root, project_directory):
+    # names are resolved through the assembly scopes of the reference graph, so that
+    # entities with the same name in different assemblies are kept apart
+    entities, references = build_reference_graph(root)
+    edges, errors = resolve_reference_graph(entities, references)
+
+    coverages = dict()
+    priorities = dict()
+    stats = dict()
+    stats_cache = load_mesh_stats_cache(project_directory)
+
+    for object_instance, parent, scope in entities:
+        if object_instance.tag != 'object_instance':
+            continue
+
+        targets = edges.get(object_instance, [])
+        objects = [ node for node in targets if node.tag == 'object' ]
+        materials = set(node for node in targets if node.tag == 'material')
+
+        filename = get_object_filepath(objects[0]) if len(objects) > 0 else None
+        if filename is not None and filename not in stats:
+            stats[filename] = get_mesh_stats(os.path.join(project_directory, filename), filename, stats_cache)
+        mesh_stats = stats.get(filename)
+        coverage = None if mesh_stats is None else (mesh_stats[1] if mesh_stats[1] > 0.0 else float(mesh_stats[0]))
+
+        for material in materials:
+            priority = get_material_priority(material.attrib['name'])
+            for surface_shader in edges.get(material, []):
+                if surface_shader.tag != 'surface_shader' or get_param(material, 'surface_shader') != surface_shader.attrib['name']:
+                    continue
+                coverages.setdefault(surface_shader, []).append(None if coverage is None else coverage / len(materials))
+                priorities[surface_shader] = max(priorities.get(surface_shader, 1.0), priority)
+
+    write_mesh_stats_cache(project_directory, stats_cache)
+
+    # instances whose mesh statistics are unknown count as an average instance
+    known_coverages = [ coverage for values in coverages.values() for coverage in values if coverage is not None ]
+    average_coverage = sum(known_coverages) / len(known_coverages) if len(known_coverages) > 0 else 1.0
+
+    # shaders that nothing renders with neither take part in the budget nor get samples
+    reachable = collect_reachable_entities(entities, edges)
+
+    weights = []
+
+    for surface_shader, parent, scope in entities:
+        if surface_shader.tag == 'surface_shader' and surface_shader.attrib['model'] == 'physical_surface_shader' and surface_shader in reachable:
+            coverage = sum(average_coverage if value is None else value for value in coverages.get(surface_shader, []))
+            weights.append((surface_shader, parent, coverage * priorities.get(surface_shader, 1.0)))
+
+    return weights
+
+def distribute_samples(weights, budget):
+    # water-filling: shares proportional to weights, with shares that fall outside of
+    # [MIN_SAMPLE_COUNT, MAX_SAMPLE_COUNT] pinned to the bound and the difference
+    # redistributed among the other shaders
+    shares = [ None ] * len(weights)
+
+    while True:
+        free = [ i for i in range(len(weights)) if shares[i] is None ]
+        if len(free) == 0:
+            return shares
+
+        remaining = budget - sum(share for share in shares if share is not None)
+        free_weight = sum(weights[i] for i in free)
+
+        if free_weight > 0.0:
+            candidates = dict((i, remaining * weights[i] / free_weight) for i in free)
+        else:
+            candidates = dict((i, float(remaining) / len(free)) for i in free)
+
+        below = [ i for i in free if candidates[i] < MIN_SAMPLE_COUNT ]
+        above = [ i for i in free if candidates[i] > MAX_SAMPLE_COUNT ]
+
+        if len(below) == 0 and len(above) == 0:
+            for i in free:
+                shares[i] = candidates[i]
+            return shares
+
+        # pin the side whose violation is the largest first, the other side may resolve itself
+        deficit = sum(MIN_SAMPLE_COUNT - candidates[i] for i in below)
+        surplus = sum(candidates[i] - MAX_SAMPLE_COUNT for i in above)
+
+        if deficit >= surplus:
+            for i in below:
+                shares[i] = float(MIN_SAMPLE_COUNT)
+        else:
+            for i in above:
+                shares[i] = float(MAX_SAMPLE_COUNT)
+
+def allocate_samples(weights, budget):
+    # returns one sample count per weight, in [MIN_SAMPLE_COUNT, MAX_SAMPLE_COUNT], summing
+    # to the budget (or to len(weights) * MAX_SAMPLE_COUNT if the budget exceeds it)
+    budget = min(budget, len(weights) * MAX_SAMPLE_COUNT)
+    shares = distribute_samples(weights, budget)
+
+    # largest remainder rounding
+    allocation = [ int(math.floor(share + 1.0e-9)) for share in shares ]
+    order = sorted(range(len(shares)), key=lambda i: shares[i] - allocation[i], reverse=True)
+    remaining = budget - sum(allocation)
+
+    for i in order:
+        if remaining <= 0:
+            break
+        if allocation[i] < MAX_SAMPLE_COUNT:
+            allocation[i] += 1
+            remaining -= 1
+
+    return allocation
+
+def allocate_sample_budget(root, project_directory, budget):
+    print("  Allocating a budget of {0} samples:".format(budget))
+
+    weights = compute_surface_shader_weights(root, project_directory)
+
+    if len(weights) * MIN_SAMPLE_COUNT > budget:
+        print("ERROR: a budget of {0} samples cannot give {1} sample(s) to each of the {2} physical surface shaders.".format(
+            budget, MIN_SAMPLE_COUNT, len(weights)))
+        sys.exit(1)
+
+    counts = allocate_samples([ weight for surface_shader, parent, weight in weights ], budget)
+    total_weight = sum(weight for surface_shader, parent, weight in weights)
+
+    for (surface_shader, parent, weight), count in zip(weights, counts):
+        share = 0.0 if total_weight <= 0.0 else 100.0 * weight / total_weight
+        print("    Setting sample count to \"{0}\" on surface shader \"{1}\" in {2} \"{3}\" ({4:.1f}% of weight)...".format(
+            count, surface_shader.attrib['name'], parent.tag, parent.get('name', ''), share))
+        set_param(surface_shader, "front_lighting_samples", str(count))
+
+    allocated = sum(counts)
+
+    if allocated < budget:
+        print("  Allocated {0} samples across {1} surface shaders ({2} samples left unused, every shader is capped at {3}).".format(
+            allocated, len(weights), budget - allocated, MAX_SAMPLE_COUNT))
+    else:
+        print("  Allocated {0} samples across {1} surface shaders.".format(allocated, len(weights)))
+
+
+#--------------------------------------------------------------------------------------------------
+# Tweaks that only touch entities local to an assembly.
+#--------------------------------------------------------------------------------------------------
+
+def apply_assembly_tweaks(root):
+    replace_mesh_file_extensions(root)
+
+    replace_hair_shader(root)
+    tweak_hood_shaders(root)
+    tweak_wolf_shaders(root)
+    tweak_vegetation_shaders(root)
+    tweak_area_lights(root)
+
+
+#--------------------------------------------------------------------------------------------------
+# Apply assembly tweaks to each top-level assembly in a separate process.
+#--------------------------------------------------------------------------------------------------
+
+def process_assembly_chunk(chunk):
+    # runs in a worker process: the assembly travels as serialized XML and the
+    # log is captured so that it can be printed in order by the main process
+    assembly = convert_element(xml.fromstring(chunk))
+
+    log = StringIO()
+    stdout = sys.stdout
+    sys.stdout = log
+    try:
+        wrapper = Entity('chunk')
+        wrapper.append(assembly)
+        apply_assembly_tweaks(wrapper)
+    finally:
+        sys.stdout = stdout
+
+    return xml.tostring(assembly.to_element()), log.getvalue()
+
+def apply_assembly_tweaks_in_parallel(root, jobs):
+    scene = root.find("scene")
+    assemblies = [ (index, node) for index, node in enumerate(scene) if node.tag == 'assembly' ]
+
+    print("  Splitting project into {0} assembly chunks ({1} jobs)...".format(len(assemblies), jobs))
+
+    chunks = [ xml.tostring(assembly.to_element()) for index, assembly in assemblies ]
+
+    pool = multiprocessing.Pool(jobs)
+    try:
+        results = pool.map(process_assembly_chunk, chunks)
+    finally:
+        pool.close()
+        pool.join()
+
+    for (index, old_assembly), (chunk, log) in zip(assemblies, results):
+        print("  Assembly \"{0}\":".format(old_assembly.attrib['name']))
+        sys.stdout.write(log)
+
+        new_assembly = convert_element(xml.fromstring(chunk))
+        new_assembly.tail = old_assembly.tail
+        scene[index] = new_assembly
+
+
 #--------------------------------------------------------------------------------------------------
 # Applies a series of tweaks to a given appleseed project file.
 #--------------------------------------------------------------------------------------------------
 
+def get_work_project_filepath(filepath):
+    directory, filename = os.path.split(filepath)
+    return os.path.join(directory, WORK_FILE_PREFIX + filename)
+
+def is_work_project_file(filepath):
+    return os.path.basename(filepath).startswith(WORK_FILE_PREFIX)
+
 def process_file(filepath, args):
     if not os.path.exists(BACKUP_DIRECTORY):
         os.makedirs(BACKUP_DIRECTORY)
@@ -482,27 +1464,33 @@ def process_file(filepath, args):
     filename = os.path.basename(filepath)
     backup_filepath = os.path.join(BACKUP_DIRECTORY, os.path.basename(filepath))
 
+    # the work copy lives next to the project file so that relative paths resolve as they would in it
+    work_filepath = get_work_project_filepath(filepath)
+
     if os.path.exists(backup_filepath):
         print("Restoring project file from {0}...".format(backup_filepath))
-        shutil.copyfile(backup_filepath, filepath)
     else:
         print("Backuping project file to {0}...".format(backup_filepath))
         shutil.copyfile(filepath, backup_filepath)
 
-    update_project_file(filepath, args.tool_path, ["--to-revision", "5"])
+    # the project file itself is only written once the final tree has been validated
+    shutil.copyfile(backup_filepath, work_filepath)
+    update_project_file(work_filepath, args.tool_path, ["--to-revision", "5"])
 
     print("Processing {0}:".format(filepath))
 
-    tree = load_project_file(filepath)
+    tree = load_project_file(work_filepath)
     root = tree.getroot()
+    os.remove(work_filepath)
 
-    replace_mesh_file_extensions(root)
+    if not validate_references(root):
+        print("ERROR: project file {0} contains invalid references.".format(filepath))
+        sys.exit(1)
 
-    replace_hair_shader(root)
-    tweak_hood_shaders(root)
-    tweak_wolf_shaders(root)
-    tweak_vegetation_shaders(root)
-    tweak_area_lights(root)
+    if args.jobs > 0:
+        apply_assembly_tweaks_in_parallel(root, args.jobs)
+    else:
+        apply_assembly_tweaks(root)
 
     tweak_frames(root)
 
@@ -510,21 +1498,153 @@ def process_file(filepath, args):
         add_sky(root, "50.0")
         #add_sky(root, "180.0")
 
+    if args.sample_budget is not None:
+        allocate_sample_budget(root, os.path.dirname(filepath), args.sample_budget)
+
     assign_render_layers(root)
 
+    if args.prune_unused:
+        prune_unused_entities(root)
+
+    if not validate_references(root):
+        print("ERROR: tweaks left invalid references in project file {0}, not writing it.".format(filepath))
+        sys.exit(1)
+
+    if args.proxy:
+        proxy_filepath = get_proxy_project_filepath(filepath)
+        proxy_tree = copy.deepcopy(tree)
+
+        print("Making proxy project {0}:".format(proxy_filepath))
+        make_proxy_project(proxy_tree.getroot(), os.path.dirname(filepath), args.proxy_scale)
+
     write_project_file(filepath, tree)
 
     update_project_file(filepath, args.tool_path)
 
+    if args.proxy:
+        write_project_file(proxy_filepath, proxy_tree)
+        update_project_file(proxy_filepath, args.tool_path)
+
+
+#--------------------------------------------------------------------------------------------------
+# Read-only reports on a given appleseed project file, answered from its sidecar index.
+#--------------------------------------------------------------------------------------------------
+
+def report_materials(connection, material_marker):
+    print("  Materials matching \"{0}\":".format(material_marker))
+
+    for entity_id, name, model, assembly in project_index.find_entities(connection, 'material', material_marker):
+        parameters = project_index.get_entity_parameters(connection, entity_id)
+        print("    Material \"{0}\" in assembly \"{1}\": BSDF \"{2}\", surface shader \"{3}\".".format(
+            name, assembly, parameters.get('bsdf'), parameters.get('surface_shader')))
+
+def report_render_layer(connection, render_layer_name):
+    print("  Entities in render layer \"{0}\":".format(render_layer_name))
+
+    for type, name, assembly in project_index.find_entities_with_parameter(connection, 'render_layer', render_layer_name):
+        print("    {0} \"{1}\" in assembly \"{2}\".".format(type, name, assembly))
+
+def report_references(connection, target_name):
+    print("  Entities referencing \"{0}\":".format(target_name))
+
+    for type, name, reference_name in project_index.find_referencing_entities(connection, target_name):
+        print("    {0} \"{1}\" (\"{2}\").".format(type, name, reference_name))
+
+def report_dependencies(connection):
+    print("  File dependencies:")
+
+    for path in sorted(project_index.get_file_dependencies(connection)):
+        print("    {0}".format(path))
+
+def report_file(filepath, args):
+    print("Reporting on {0}:".format(filepath))
+
+    try:
+        connection = project_index.open_index(filepath)
+    except IOError:
+        print("ERROR: failed to load project file {0}.".format(filepath))
+        sys.exit(1)
+
+    try:
+        if args.list_materials is not None:
+            report_materials(connection, args.list_materials)
+        if args.list_render_layer is not None:
+            report_render_layer(connection, args.list_render_layer)
+        if args.list_references is not None:
+            report_references(connection, args.list_references)
+        if args.list_dependencies:
+            report_dependencies(connection)
+    finally:
+        connection.close()
+
 
 #--------------------------------------------------------------------------------------------------
 # Process all files in the current directory.
 #--------------------------------------------------------------------------------------------------
 
-def process_files_in_current_directory(args):
+def process_files_in_current_directory(args, process=process_file):
     for filepath in walk(".", False):
-        if os.path.splitext(filepath)[1] == ".appleseed":
-            process_file(filepath, args)
+        if os.path.splitext(filepath)[1] != ".appleseed":
+            continue
+        if is_proxy_project_file(filepath) or is_work_project_file(filepath):
+            continue
+        process(filepath, args)
+
+
+#--------------------------------------------------------------------------------------------------
+# Copy the sky texture (and generate its downsampled proxy variant) to the shot directory.
+#--------------------------------------------------------------------------------------------------
+
+def is_up_to_date(filepath, source_filepath):
+    return os.path.isfile(filepath) and os.path.getmtime(filepath) >= os.path.getmtime(source_filepath)
+
+def make_downsampled_texture(source_filepath, dest_filepath, scale, oiiotool_path):
+    # write to a temporary file so that an interrupted run never leaves a truncated proxy behind
+    temp_filepath = dest_filepath + ".tmp.exr"
+    args = [oiiotool_path, source_filepath, "--resize", "{0}%".format(scale * 100.0), "-o", temp_filepath]
+
+    try:
+        result = subprocess.call(args)
+    except OSError as e:
+        print("WARNING: could not run {0}: {1}.".format(oiiotool_path, e))
+        return False
+
+    if result != 0 or not os.path.isfile(temp_filepath):
+        print("WARNING: {0} failed to downsample {1}.".format(oiiotool_path, source_filepath))
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        return False
+
+    if os.path.exists(dest_filepath):
+        os.remove(dest_filepath)
+
+    os.rename(temp_filepath, dest_filepath)
+
+    return True
+
+def copy_sky_texture(proxy, proxy_scale, oiiotool_path):
+    print("Copying {0} to shot directory...".format(SKY_TEXTURE_FILENAME))
+    script_directory = os.path.dirname(os.path.realpath(__file__))
+    source_sky_filepath = os.path.join(script_directory, SKY_TEXTURE_FILENAME)
+    shutil.copyfile(source_sky_filepath, os.path.join(TEXTURES_DIRECTORY, SKY_TEXTURE_FILENAME))
+
+    if not proxy:
+        return
+
+    proxy_directory = os.path.join(TEXTURES_DIRECTORY, PROXY_DIRECTORY)
+    proxy_sky_filepath = os.path.join(proxy_directory, SKY_TEXTURE_FILENAME)
+
+    # the downsampled variant is cached in the shot directory and only regenerated
+    # when the sky texture shipped with this script is newer than it
+    if is_up_to_date(proxy_sky_filepath, source_sky_filepath):
+        return
+
+    print("Downsampling {0} for proxy projects...".format(SKY_TEXTURE_FILENAME))
+
+    if not os.path.exists(proxy_directory):
+        os.makedirs(proxy_directory)
+
+    make_downsampled_texture(source_sky_filepath, proxy_sky_filepath, proxy_scale, oiiotool_path)
 
 
 #--------------------------------------------------------------------------------------------------
@@ -533,22 +1653,49 @@ def process_files_in_current_directory(args):
 
 def main():
     parser = argparse.ArgumentParser(description="apply post-export transformations to one or multiple project files from Mescaline.")
-    parser.add_argument("-t", "--tool-path", metavar="tool-path", required=True,
-                        help="set the path to the updateprojectfile tool")
+    parser.add_argument("-t", "--tool-path", metavar="tool-path",
+                        help="set the path to the updateprojectfile tool (required unless only reporting)")
     parser.add_argument("--add-sky", action='store_true', help="add a sky to the scene")
+    parser.add_argument("--proxy", action='store_true',
+                        help="also write a lightweight proxy project for interactive lookdev renders")
+    parser.add_argument("--proxy-scale", metavar="scale", type=float, default=PROXY_RESOLUTION_SCALE,
+                        help="set the frame resolution scale of proxy projects (default: {0})".format(PROXY_RESOLUTION_SCALE))
+    parser.add_argument("--oiiotool-path", metavar="oiiotool-path", default="oiiotool",
+                        help="set the path to the oiiotool used to downsample the sky texture of proxy projects")
+    parser.add_argument("--sample-budget", metavar="samples", type=int,
+                        help="distribute this total number of lighting samples across physical surface shaders")
+    parser.add_argument("--prune-unused", action='store_true',
+                        help="remove BSDFs, textures, materials, etc. that are not referenced by the scene")
+    parser.add_argument("-j", "--jobs", metavar="jobs", type=int, default=0,
+                        help="split projects into per-assembly chunks and tweak them using this many processes")
+    parser.add_argument("--list-materials", metavar="marker",
+                        help="only report the materials whose name contains this marker, without modifying anything")
+    parser.add_argument("--list-render-layer", metavar="render-layer",
+                        help="only report the entities assigned to this render layer, without modifying anything")
+    parser.add_argument("--list-references", metavar="name",
+                        help="only report the entities referencing the entity with this name, without modifying anything")
+    parser.add_argument("--list-dependencies", action='store_true',
+                        help="only report the file dependencies, without modifying anything")
     parser.add_argument("file", nargs='?', help="file to process (process all files in the current directory if omitted)")
     args = parser.parse_args()
 
+    if args.list_materials is not None or args.list_render_layer is not None or args.list_references is not None or args.list_dependencies:
+        if args.file is None:
+            process_files_in_current_directory(args, report_file)
+        else:
+            report_file(args.file, args)
+        return
+
+    if args.tool_path is None:
+        parser.error("argument -t/--tool-path is required")
+
+    if args.add_sky:
+        copy_sky_texture(args.proxy, args.proxy_scale, args.oiiotool_path)
+
     if args.file is None:
         process_files_in_current_directory(args)
     else:
         process_file(args.file, args)
 
-    if args.add_sky:
-        print("Copying {0} to shot directory...".format(SKY_TEXTURE_FILENAME))
-        script_directory = os.path.dirname(os.path.realpath(__file__))
-        shutil.copyfile(os.path.join(script_directory, SKY_TEXTURE_FILENAME),
-                        os.path.join(TEXTURES_DIRECTORY, SKY_TEXTURE_FILENAME))
-
 if __name__ == '__main__':
     main()
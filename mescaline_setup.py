@@ -28,6 +28,34 @@ import ms_commands
 reload(ms_commands)
 
 CUSTOM_ATTR_NAME = 'UDP3DSMAX'
+PROCESSED_ATTR_NAME = 'mescaline_setup'
+PROCESSED_SEPARATOR = '|'
+LIGHT_INTENSITY_MULTIPLIER = 2.5
+
+
+#--------------------------------------------------------------------------------------------------
+# Track which nodes have already been handled by setup().
+#--------------------------------------------------------------------------------------------------
+
+def get_processed_marker(node):
+    # returns (conversion, source) or None if the node was never processed
+    if not cmds.attributeQuery(PROCESSED_ATTR_NAME, n=node, exists=True):
+        return None
+
+    value = cmds.getAttr(node + '.' + PROCESSED_ATTR_NAME) or ''
+    parts = value.split(PROCESSED_SEPARATOR, 1)
+
+    if len(parts) != 2:
+        return None
+
+    return parts[0], parts[1]
+
+def set_processed_marker(node, conversion, source):
+    if not cmds.attributeQuery(PROCESSED_ATTR_NAME, n=node, exists=True):
+        cmds.addAttr(node, ln=PROCESSED_ATTR_NAME, dt='string')
+
+    cmds.setAttr(node + '.' + PROCESSED_ATTR_NAME, conversion + PROCESSED_SEPARATOR + source, type='string')
+
 
 def parse_custom_attributes(entity):
     print("Parsing custom attributes on {0}...".format(entity))
@@ -63,6 +91,11 @@ def parse_custom_attributes(entity):
     return attributes
 
 
+def set_area_light_edf_attributes(light_edf, attributes):
+    cmds.setAttr(light_edf + '.exitance', attributes['color'][0], attributes['color'][1], attributes['color'][2], type='double3')
+    cmds.setAttr(light_edf + '.exitance_multiplier', attributes['multiplier'], attributes['multiplier'], attributes['multiplier'], type='double3')
+
+
 def convert_area_light(area_light, attributes):
     # create and initialise material for object
     light_material = cmds.createNode('ms_appleseed_material', n=area_light + '_material')
@@ -75,8 +108,7 @@ def convert_area_light(area_light, attributes):
 
     # create and initialise edf
     light_edf = ms_commands.create_shading_node('diffuse_edf', area_light + '_edf')
-    cmds.setAttr(light_edf + '.exitance', attributes['color'][0], attributes['color'][1], attributes['color'][2], type='double3')
-    cmds.setAttr(light_edf + '.exitance_multiplier', attributes['multiplier'], attributes['multiplier'], attributes['multiplier'], type='double3')
+    set_area_light_edf_attributes(light_edf, attributes)
 
     # assign material and connect up nodes
     cmds.select(area_light)
@@ -85,6 +117,37 @@ def convert_area_light(area_light, attributes):
     cmds.connectAttr(light_surface_shader + '.outColor', light_material + '.surface_shader_front_color', f=True)
 
 
+def get_area_light_edf(area_light):
+    # follow the connections made by convert_area_light() rather than relying on node names,
+    # which Maya changes on creation when they are already taken or which users may rename
+    shapes = cmds.listRelatives(area_light, shapes=True)
+
+    if not shapes:
+        return None
+
+    for shading_group in cmds.listConnections(shapes, type='shadingEngine') or []:
+        for material in cmds.listConnections(shading_group + '.surfaceShader', source=True, destination=False) or []:
+            if not cmds.attributeQuery('EDF_front_color', n=material, exists=True):
+                continue
+            edfs = cmds.listConnections(material + '.EDF_front_color', source=True, destination=False) or []
+            if len(edfs) > 0:
+                return edfs[0]
+
+    return None
+
+
+def update_area_light(area_light, attributes):
+    # the material network already exists, only refresh the values driven by the custom attributes
+    light_edf = get_area_light_edf(area_light)
+
+    if light_edf is None:
+        return False
+
+    set_area_light_edf_attributes(light_edf, attributes)
+
+    return True
+
+
 def add_gobo(dummy_object, attributes):
     attributes = parse_custom_attributes(dummy_object)
     cmds.select(attributes['from_spot_light'])
@@ -98,6 +161,16 @@ def add_gobo(dummy_object, attributes):
     cmds.delete()
 
 
+def set_camera_f_stop(camera, f_stop):
+    f_stop_multiplier = 1.0
+    while f_stop < 1.0:
+        f_stop *= 2.0
+        f_stop_multiplier /= 2.0
+
+    cmds.setAttr(camera + '.fStop', f_stop)
+    cmds.setAttr(camera + '.focusRegionScale', f_stop_multiplier)
+
+
 def setup_dof(target, camera, f_stop):
     cmds.setAttr(camera + '.depthOfField', 1)
 
@@ -118,34 +191,63 @@ def setup_dof(target, camera, f_stop):
     distance_node = cmds.distanceDimension(cam_locator, target_locator)
     cmds.connectAttr(distance_node + '.distance', camera + '.focusDistance')
 
-    f_stop_multiplier = 1.0
-    while f_stop < 1.0:
-        f_stop *= 2.0
-        f_stop_multiplier /= 2.0
+    set_camera_f_stop(camera, f_stop)
 
-    cmds.setAttr(camera + '.fStop', f_stop)
-    cmds.setAttr(camera + '.focusRegionScale', f_stop_multiplier)
+
+def setup_transform(transform):
+    source = cmds.getAttr(transform + '.' + CUSTOM_ATTR_NAME) or ''
+    marker = get_processed_marker(transform)
+
+    if marker is not None and marker[1] == source:
+        print("Skipping {0}, already processed as {1}.".format(transform, marker[0]))
+        return
+
+    attributes = parse_custom_attributes(transform)
+    if 'type' not in attributes.keys():
+        return
+
+    type = attributes['type']
+    previous_type = marker[0] if marker is not None else None
+
+    if type == 'arealight':
+        if previous_type != type or not update_area_light(transform, attributes):
+            convert_area_light(transform, attributes)
+        set_processed_marker(transform, type, source)
+    elif type == 'gobo_dummy':
+        # the dummy object is deleted once the gobo is connected, no need to mark it
+        add_gobo(transform, attributes)
+    elif type == 'camera':
+        if previous_type == type:
+            set_camera_f_stop(transform, attributes['f_stop'])
+            set_processed_marker(transform, type, source)
+        elif cmds.objExists('dof_target'):
+            setup_dof('dof_target', transform, attributes['f_stop'])
+            set_processed_marker(transform, type, source)
+
+
+def setup_light(light):
+    # the multiplier is applied once: lights carrying a marker are left alone, including
+    # those whose intensity was adjusted by hand since; the marker keeps the original intensity
+    marker = get_processed_marker(light)
+
+    if marker is not None:
+        print("Skipping {0}, intensity already adjusted.".format(light))
+        return
+
+    intensity = cmds.getAttr(light + '.intensity')
+    cmds.setAttr(light + '.intensity', intensity * LIGHT_INTENSITY_MULTIPLIER)
+    set_processed_marker(light, 'intensity', repr(intensity))
 
 
 def setup():
     for transform in cmds.ls(tr=True):
         if cmds.attributeQuery(CUSTOM_ATTR_NAME, n=transform, exists=True):
-            attributes = parse_custom_attributes(transform)
-            if 'type' in attributes.keys():
-                type = attributes['type']
-                if type == 'arealight':
-                    convert_area_light(transform, attributes)
-                elif type == 'gobo_dummy':
-                    add_gobo(transform, attributes)
-                elif type == 'camera':
-                    if cmds.objExists('dof_target'):
-                        setup_dof('dof_target', transform, attributes['f_stop'])
+            setup_transform(transform)
 
     # adjust light multiplier values
     for light in cmds.ls(lt=True):
         light_type = cmds.nodeType(light)
         if light_type == 'spotLight' or light_type == 'pointLight':
-            intensity = cmds.getAttr(light + '.intensity') * 2.5
-            cmds.setAttr(light + '.intensity', intensity)
+            setup_light(light)
 
     print("Done.")
@@ -0,0 +1,220 @@
+#
+# Copyright (c) 2013 Francois Beaune
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+#
+# Sidecar SQLite index of the entities, parameters, references and file dependencies
+# of an appleseed project file, stored next to it as <project>.appleseed.index.
+#
+# The index records the SHA-1 of the project file it was built from and is rebuilt
+# whenever the project file changes, so that repeated queries only pay for hashing
+# the file instead of parsing it.
+#
+
+import hashlib
+import os
+import sqlite3
+import xml.etree.ElementTree as xml
+
+
+#--------------------------------------------------------------------------------------------------
+# Constants.
+#--------------------------------------------------------------------------------------------------
+
+INDEX_FILE_EXTENSION = ".index"
+SCHEMA_VERSION = "2"
+
+SCHEMA = """
+    CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+    CREATE TABLE entities (id INTEGER PRIMARY KEY, type TEXT, name TEXT, model TEXT, parent INTEGER, assembly TEXT);
+    CREATE TABLE parameters (entity INTEGER, name TEXT, value TEXT);
+    CREATE TABLE refs (entity INTEGER, name TEXT, target TEXT);
+    CREATE TABLE dependencies (entity INTEGER, path TEXT);
+    CREATE INDEX entities_by_type_and_name ON entities (type, name);
+    CREATE INDEX parameters_by_entity ON parameters (entity);
+    CREATE INDEX parameters_by_name_and_value ON parameters (name, value);
+    CREATE INDEX refs_by_target ON refs (target);
+"""
+
+# Entity attributes that reference another entity.
+REFERENCE_ATTRIBUTES = {
+    'texture_instance':     'texture',
+    'object_instance':      'object',
+    'assembly_instance':    'assembly',
+    'assign_material':      'material'
+}
+
+
+#--------------------------------------------------------------------------------------------------
+# Build the index of a given project file.
+#--------------------------------------------------------------------------------------------------
+
+def get_index_filepath(project_filepath):
+    return project_filepath + INDEX_FILE_EXTENSION
+
+def compute_content_hash(filepath):
+    hash = hashlib.sha1()
+
+    with open(filepath, 'rb') as file:
+        while True:
+            chunk = file.read(1024 * 1024)
+            if len(chunk) == 0:
+                break
+            hash.update(chunk)
+
+    return hash.hexdigest()
+
+def populate_index(connection, project_filepath):
+    entities = []
+    parameters = []
+    refs = []
+    dependencies = []
+
+    # stack of (element, entity id, enclosing assembly name)
+    stack = [ (None, None, None) ]
+
+    for event, element in xml.iterparse(project_filepath, events=('start', 'end')):
+        parent_element, entity_id, assembly = stack[-1]
+        tag = element.tag
+
+        if event == 'end':
+            if element is parent_element:
+                stack.pop()
+            element.clear()
+            continue
+
+        if tag == 'parameter':
+            name = element.get('name')
+            value = element.get('value')
+            if parent_element is not None and parent_element.tag == 'parameters':
+                group_name = parent_element.get('name')
+                if group_name == 'filename':
+                    dependencies.append((entity_id, value))
+                name = group_name + "." + name
+            elif name == 'filename':
+                dependencies.append((entity_id, value))
+            if entity_id is not None:
+                parameters.append((entity_id, name, value))
+            continue
+
+        if tag != 'parameters' and 'name' in element.attrib:
+            new_entity_id = len(entities) + 1
+            entities.append((new_entity_id, tag, element.get('name'), element.get('model'), entity_id, assembly))
+            entity_id = new_entity_id
+            if tag == 'assembly':
+                assembly = element.get('name')
+
+        # recorded once the element's own entity exists, so that e.g. a texture instance is
+        # the source of its reference; assign_material elements have no name and refer to
+        # their object instance
+        if tag in REFERENCE_ATTRIBUTES and entity_id is not None:
+            name = REFERENCE_ATTRIBUTES[tag]
+            refs.append((entity_id, name, element.get(name)))
+
+        stack.append((element, entity_id, assembly))
+
+    connection.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?)", entities)
+    connection.executemany("INSERT INTO parameters VALUES (?, ?, ?)", parameters)
+    connection.executemany("INSERT INTO refs VALUES (?, ?, ?)", refs)
+    connection.executemany("INSERT INTO dependencies VALUES (?, ?)", dependencies)
+
+    # parameters whose value is the name of an entity are references too
+    connection.execute("""
+        INSERT INTO refs
+        SELECT entity, name, value FROM parameters
+        WHERE value IN (SELECT name FROM entities)""")
+
+def build_index(project_filepath, index_filepath, content_hash):
+    # build into a temporary file so that concurrent readers never see a partial index
+    temp_filepath = index_filepath + ".tmp{0}".format(os.getpid())
+
+    if os.path.exists(temp_filepath):
+        os.remove(temp_filepath)
+
+    connection = sqlite3.connect(temp_filepath)
+    try:
+        connection.executescript(SCHEMA)
+        populate_index(connection, project_filepath)
+        connection.executemany("INSERT INTO meta VALUES (?, ?)", [ ('schema_version', SCHEMA_VERSION),
+                                                                    ('content_hash', content_hash) ])
+        connection.commit()
+    finally:
+        connection.close()
+
+    if os.path.exists(index_filepath):
+        os.remove(index_filepath)
+
+    os.rename(temp_filepath, index_filepath)
+
+def read_index_meta(index_filepath):
+    connection = sqlite3.connect(index_filepath)
+    try:
+        return dict(connection.execute("SELECT key, value FROM meta"))
+    except sqlite3.DatabaseError:
+        return dict()
+    finally:
+        connection.close()
+
+def open_index(project_filepath):
+    # returns a connection to an up-to-date index of the project file, building it if needed
+    index_filepath = get_index_filepath(project_filepath)
+    content_hash = compute_content_hash(project_filepath)
+
+    meta = read_index_meta(index_filepath) if os.path.exists(index_filepath) else dict()
+
+    if meta.get('schema_version') != SCHEMA_VERSION or meta.get('content_hash') != content_hash:
+        print("Indexing {0}...".format(project_filepath))
+        build_index(project_filepath, index_filepath, content_hash)
+
+    return sqlite3.connect(index_filepath)
+
+
+#--------------------------------------------------------------------------------------------------
+# Queries.
+#--------------------------------------------------------------------------------------------------
+
+def get_file_dependencies(connection):
+    return [ path for (path,) in connection.execute("SELECT DISTINCT path FROM dependencies") ]
+
+def find_entities(connection, type, name_marker):
+    # return (id, name, model, assembly) of the entities of a given type whose name contains a marker
+    return connection.execute(
+        "SELECT id, name, model, assembly FROM entities WHERE type = ? AND instr(name, ?) > 0 ORDER BY id",
+        (type, name_marker)).fetchall()
+
+def get_entity_parameters(connection, entity_id):
+    # entities are identified by id since names are only unique within an assembly
+    return dict(connection.execute(
+        "SELECT name, value FROM parameters WHERE entity = ?",
+        (entity_id,)))
+
+def find_entities_with_parameter(connection, parameter_name, parameter_value):
+    # return (type, name, assembly) of the entities having a given parameter value
+    return connection.execute(
+        "SELECT e.type, e.name, e.assembly FROM entities e JOIN parameters p ON p.entity = e.id "
+        "WHERE p.name = ? AND p.value = ? ORDER BY e.id",
+        (parameter_name, parameter_value)).fetchall()
+
+def find_referencing_entities(connection, target_name):
+    # return (type, name, parameter or attribute name) of the entities referencing a given name
+    return connection.execute(
+        "SELECT e.type, e.name, r.name FROM refs r JOIN entities e ON r.entity = e.id WHERE r.target = ? ORDER BY e.id",
+        (target_name,)).fetchall()